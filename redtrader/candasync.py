@@ -0,0 +1,143 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 tw=0 noet :
+#======================================================================
+#
+# candasync.py - asyncio front-end of candrec (python 3.6+)
+#
+# Created by skywind on 2018/09/10
+# Last Modified: 2018/09/10 18:20
+#
+#======================================================================
+import asyncio
+import functools
+import concurrent.futures
+
+from . import candrec
+
+
+#----------------------------------------------------------------------
+# AsyncCandleStore: candrec calls run on a bounded thread pool over a
+# CandlePool, concurrent writes to the same table are coalesced into
+# one executemany, large reads can be iterated with "async for"
+#----------------------------------------------------------------------
+class AsyncCandleStore (object):
+
+	# workers: threads and pooled connections
+	# backlog: max calls queued or running before callers have to wait
+	def __init__ (self, uri, workers = 4, init = False, profile = None,
+			backlog = 64):
+		self.pool = candrec.connect(uri, init, profile, pool = workers)
+		self.executor = concurrent.futures.ThreadPoolExecutor(workers)
+		self.backlog = backlog
+		self.__limit = None
+		self.__batches = {}
+		self.__flushing = set()
+
+	async def __run (self, func, *args, **kwargs):
+		if self.__limit is None:
+			self.__limit = asyncio.Semaphore(self.backlog)
+		loop = asyncio.get_event_loop()
+		call = functools.partial(func, *args, **kwargs)
+		async with self.__limit:
+			return await loop.run_in_executor(self.executor, call)
+
+	# every write issued in the same loop iteration for (kind, mode)
+	# joins one batch, written by a single *_write_many call
+	async def __coalesce (self, kind, mode, symbol, data):
+		loop = asyncio.get_event_loop()
+		key = (kind, mode)
+		batch = self.__batches.get(key)
+		if batch is None:
+			batch = []
+			self.__batches[key] = batch
+			task = asyncio.ensure_future(self.__flush(key))
+			self.__flushing.add(task)
+			task.add_done_callback(self.__flushing.discard)
+		future = loop.create_future()
+		batch.append((symbol, data, future))
+		return await future
+
+	async def __flush (self, key):
+		await asyncio.sleep(0)
+		batch = self.__batches.pop(key)
+		kind, mode = key
+		items = [ (symbol, data) for symbol, data, future in batch ]
+		write = getattr(self.pool, kind + '_write_many')
+		try:
+			result = await self.__run(write, items, mode)
+		except Exception as e:
+			for symbol, data, future in batch:
+				if not future.done():
+					future.set_exception(e)
+			return
+		for symbol, data, future in batch:
+			if not future.done():
+				future.set_result(result)
+
+	async def candle_write (self, symbol, candles, mode = 'd'):
+		return await self.__coalesce('candle', mode, symbol, candles)
+
+	async def tick_write (self, symbol, ticks, mode = 1):
+		return await self.__coalesce('tick', mode, symbol, ticks)
+
+	# chunks are read by ts pagination, so no connection is held while
+	# the consumer is working on a chunk
+	async def candle_iter (self, symbol, start, end, mode = 'd',
+			chunk = 4096):
+		while start < end:
+			items = await self.__run(self.pool.candle_read, symbol,
+					start, end, mode, chunk)
+			for item in items:
+				yield item
+			if len(items) < chunk:
+				break
+			start = items[-1].ts + 1
+
+	async def tick_iter (self, symbol, start, end, mode = 1, chunk = 4096):
+		while start < end:
+			items = await self.__run(self.pool.tick_read, symbol,
+					start, end, mode, chunk)
+			for item in items:
+				yield item
+			if len(items) < chunk:
+				break
+			start = items[-1].ts + 1
+
+	# any other backend method: candle_read, candle_pick, meta_read ...
+	def __getattr__ (self, name):
+		if name.startswith('_'):
+			raise AttributeError(name)
+		async def invoke (*args, **kwargs):
+			return await self.__run(self.pool.call, name, *args, **kwargs)
+		return invoke
+
+	# wait for pending writes, then release threads and connections
+	async def close (self):
+		while self.__flushing:
+			await asyncio.gather(*list(self.__flushing))
+		self.executor.shutdown(True)
+		self.pool.close()
+		return True
+
+
+#----------------------------------------------------------------------
+# testing case
+#----------------------------------------------------------------------
+if __name__ == '__main__':
+	def test1():
+		async def main():
+			store = AsyncCandleStore(':memory:')
+			cs = [ candrec.CandleStick(i, 1, 2, 0, 1, 10) for i in range(10) ]
+			await asyncio.gather(*[ store.candle_write('A%d'%(i % 3), cs[i])
+				for i in range(10) ])
+			print(await store.candle_list())
+			print(await store.candle_read('A1', 0, 100))
+			async for cs in store.candle_iter('A0', 0, 100, chunk = 2):
+				print(cs)
+			await store.close()
+		asyncio.run(main())
+		return 0
+	test1()
+
+
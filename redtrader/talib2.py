@@ -15,6 +15,12 @@ import time
 import os
 import json
 import math
+import collections
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
 
 
 #----------------------------------------------------------------------
@@ -26,6 +32,87 @@ if sys.version_info[0] >= 3:
 	xrange = range
 
 
+#----------------------------------------------------------------------
+# Rolling maximum over the last n values: monotonic deque of (index,
+# value), amortized O(1) per update
+#----------------------------------------------------------------------
+class RollingMax (object):
+	def __init__ (self, size):
+		self.n = size
+		self.q = collections.deque()
+		self.i = 0
+		self.y = None
+	def update (self, x):
+		q = self.q
+		while q and q[-1][1] <= x:
+			q.pop()
+		q.append((self.i, x))
+		if q[0][0] <= self.i - self.n:
+			q.popleft()
+		self.i += 1
+		self.y = q[0][1]
+		return self.y
+
+
+#----------------------------------------------------------------------
+# Rolling minimum over the last n values
+#----------------------------------------------------------------------
+class RollingMin (object):
+	def __init__ (self, size):
+		self.n = size
+		self.q = collections.deque()
+		self.i = 0
+		self.y = None
+	def update (self, x):
+		q = self.q
+		while q and q[-1][1] >= x:
+			q.pop()
+		q.append((self.i, x))
+		if q[0][0] <= self.i - self.n:
+			q.popleft()
+		self.i += 1
+		self.y = q[0][1]
+		return self.y
+
+
+#----------------------------------------------------------------------
+# Rolling sum over the last n values: ring buffer and running sum, 
+# exactly zero when the window holds only zeros, resynced with fsum
+# every 'resync' rounds of the window
+#----------------------------------------------------------------------
+class RollingSum (object):
+	def __init__ (self, size, resync = 16):
+		self.n = size
+		self.d = [ 0 ] * size
+		self.k = 0
+		self.p = 0
+		self.z = 0
+		self.y = 0
+		self.i = 0
+		self.resync = max(1, size * resync)
+	def update (self, x):
+		if self.k < self.n:
+			self.k += 1
+		else:
+			old = self.d[self.p]
+			self.y -= old
+			if old != 0:
+				self.z -= 1
+		self.d[self.p] = x
+		self.y += x
+		if x != 0:
+			self.z += 1
+		self.p += 1
+		if self.p >= self.n:
+			self.p = 0
+		self.i += 1
+		if self.z == 0:
+			self.y = 0
+		elif self.i % self.resync == 0:
+			self.y = math.fsum(self.d)
+		return self.y
+
+
 #----------------------------------------------------------------------
 # EMA
 #----------------------------------------------------------------------
@@ -68,27 +155,45 @@ class SMA (object):
 
 
 #----------------------------------------------------------------------
-# Simple Moving Deviation
+# Simple Moving Deviation: Welford's running mean and sum of squared
+# deviations with removal, O(1) per update; recomputed from the window
+# every 'resync' updates so rounding error can't accumulate
 #----------------------------------------------------------------------
 class SMD (object):
-	def __init__ (self, size):
+	def __init__ (self, size, resync = 16):
 		self.n = size
-		self.d = {}
-		self.x = 0
-		self.m = 0
+		self.d = collections.deque()
+		self.m = 0.0
+		self.s = 0.0
 		self.y = 0
 		self.i = 0
+		self.r = 0
+		self.resync = max(1, size * resync)
 	def update (self, x):
-		self.d[self.i] = x
-		self.x += x
-		if len(self.d) > self.n:
-			last = self.i - self.n
-			self.x -= self.d[last]
-			del self.d[last]
+		d = self.d
+		if d and x == d[-1]:
+			self.r += 1
+		else:
+			self.r = 1
+		if len(d) < self.n:
+			d.append(x)
+			delta = x - self.m
+			self.m += delta / float(len(d))
+			self.s += delta * (x - self.m)
+		else:
+			old = d.popleft()
+			d.append(x)
+			mean = self.m
+			self.m = mean + (x - old) / float(self.n)
+			self.s += (x - old) * ((x - self.m) + (old - mean))
 		self.i += 1
-		self.m = float(self.x) / len(self.d)
-		z = sum([ ((v - self.m) ** 2) for v in self.d.itervalues() ])
-		self.y = math.sqrt(z / len(self.d))
+		if self.r >= len(d):    # flat window: no residual left in s
+			self.m = float(x)
+			self.s = 0.0
+		elif self.i % self.resync == 0:
+			self.m = math.fsum(d) / len(d)
+			self.s = math.fsum([ (v - self.m) ** 2 for v in d ])
+		self.y = math.sqrt(max(self.s, 0.0) / len(d))
 		return self.y
 
 
@@ -137,25 +242,19 @@ class KDJ (object):
 		self.K = 50.0
 		self.D = 50.0
 		self.J = self.K * 3.0 - self.D * 2.0
-		self.highs = []
-		self.lows = []
+		self.highs = RollingMax(period)
+		self.lows = RollingMin(period)
 		self.RSV = 0.0
 	def update (self, high, low, close):
-		self.highs.append(high)
-		self.lows.append(low)
-		if len(self.highs) > self.n:
-			del self.highs[0]
-		if len(self.lows) > self.n:
-			del self.lows[0]
-		high = max(self.highs)
-		low = min(self.lows)
+		high = self.highs.update(high)
+		low = self.lows.update(low)
 		if high == low:
 			self.RSV = 0.0
 		else:
 			self.RSV = (close - low) * 100.0 / (high - low)
 		self.K = (self.K * (self.km - 1.0) + self.RSV) / self.km
 		self.D = (self.D * (self.dm - 1.0) + self.K) / self.dm
-		self.J = (3 * self.K) - (2 * self.J)
+		self.J = (3 * self.K) - (2 * self.D)
 		return (self.K, self.D, self.J)
 
 
@@ -164,8 +263,8 @@ class KDJ (object):
 #----------------------------------------------------------------------
 class RSI (object):
 	def __init__ (self, n = 6):
-		self.us = []
-		self.ds = []
+		self.us = RollingSum(n)
+		self.ds = RollingSum(n)
 		self.n = n
 		self.last = 0
 		self.init = False
@@ -184,14 +283,8 @@ class RSI (object):
 			U = 0
 			D = self.last - x
 		self.last = x
-		self.us.append(U)
-		self.ds.append(D)
-		if len(self.us) > self.n:
-			del self.us[0]
-		if len(self.ds) > self.n:
-			del self.ds[0]
-		u = sum(self.us) / float(self.n)
-		d = sum(self.ds) / float(self.n)
+		u = self.us.update(U) / float(self.n)
+		d = self.ds.update(D) / float(self.n)
 		x = u + d
 		if x == 0:
 			self.rsi = 0.0
@@ -205,18 +298,55 @@ class RSI (object):
 #----------------------------------------------------------------------
 class BOLL (object):
 	def __init__ (self, n = 10, k = 2):
-		self.ma = SMA(n)
 		self.md = SMD(n)
 		self.k = k
+		self.BOLL = 0.0
+		self.MD = 0.0
+		self.UPPER = 0.0
+		self.LOWER = 0.0
 	def update (self, x):
-		self.md.update(x)
-		self.BOLL = self.ma.update(x)
 		self.MD = self.md.update(x)
-		self.UPPER = BOLL + self.k * self.MD
-		self.LOWER = BOLL - self.k * self.MD
+		self.BOLL = self.md.m
+		self.UPPER = self.BOLL + self.k * self.MD
+		self.LOWER = self.BOLL - self.k * self.MD
 		return (self.BOLL, self.UPPER, self.LOWER)
 
 
+#----------------------------------------------------------------------
+# Donchian Channel
+#----------------------------------------------------------------------
+class DONCHIAN (object):
+	def __init__ (self, n = 20):
+		self.highs = RollingMax(n)
+		self.lows = RollingMin(n)
+		self.UPPER = 0.0
+		self.LOWER = 0.0
+		self.MIDDLE = 0.0
+	def update (self, high, low):
+		self.UPPER = self.highs.update(high)
+		self.LOWER = self.lows.update(low)
+		self.MIDDLE = (self.UPPER + self.LOWER) * 0.5
+		return (self.MIDDLE, self.UPPER, self.LOWER)
+
+
+#----------------------------------------------------------------------
+# Williams %R
+#----------------------------------------------------------------------
+class WR (object):
+	def __init__ (self, n = 14):
+		self.highs = RollingMax(n)
+		self.lows = RollingMin(n)
+		self.WR = 0.0
+	def update (self, high, low, close):
+		high = self.highs.update(high)
+		low = self.lows.update(low)
+		if high == low:
+			self.WR = 0.0
+		else:
+			self.WR = (high - close) * -100.0 / (high - low)
+		return self.WR
+
+
 #----------------------------------------------------------------------
 # Parabolic SAR
 #----------------------------------------------------------------------
@@ -365,6 +495,565 @@ class Indicator (object):
 			r.append(x)
 		return r
 
+	def DONCHIAN (self, highs, lows, n = 20):
+		dc = DONCHIAN(n)
+		return [ dc.update(high, low) for high, low in zip(highs, lows) ]
+
+	def WR (self, highs, lows, prices, n = 14):
+		wr = WR(n)
+		r = []
+		for high, low, price in zip(highs, lows, prices):
+			r.append(wr.update(high, low, price))
+		return r
+
+
+#----------------------------------------------------------------------
+# y[i] = (1 - alpha) * y[i - 1] + alpha * x[i], with y[-1] = init,
+# solved in blocks: inside a block the recursion is a weighted cumsum
+# (blocks are short enough to keep beta ** -size bounded), then only
+# one carry per block is chained through in python.
+#----------------------------------------------------------------------
+def _recursive_filter (x, alpha, init):
+	x = numpy.asarray(x, dtype = 'float64')
+	beta = 1.0 - alpha
+	count = len(x)
+	if count == 0:
+		return x.copy()
+	if beta == 0:
+		return alpha * x
+	size = 1
+	if abs(beta) < 1:
+		size = int(math.log(1e4) / -math.log(abs(beta)))
+	size = max(1, min(size, count))
+	nblock = (count + size - 1) // size
+	blocks = numpy.zeros(nblock * size, dtype = 'float64')
+	blocks[:count] = x
+	blocks = blocks.reshape(nblock, size)
+	power = beta ** numpy.arange(size)
+	local = numpy.cumsum(blocks * (alpha / power), axis = 1) * power
+	decay = beta ** size
+	carry = []
+	prev = init
+	for last in local[:, -1].tolist():
+		carry.append(prev)
+		prev = last + decay * prev
+	carry = numpy.array(carry, dtype = 'float64')
+	y = local + (power * beta) * carry[:, None]
+	return y.ravel()[:count]
+
+
+#----------------------------------------------------------------------
+# out[i] = reduce(x[max(0, i - n + 1):i + 1]) in O(N): van Herk/Gil-Werman
+# block prefix/suffix scans, windows span at most two blocks
+#----------------------------------------------------------------------
+def _rolling_reduce (x, n, ufunc, pad):
+	x = numpy.asarray(x, dtype = 'float64')
+	size = len(x)
+	if size == 0 or n <= 1:
+		return x.copy()
+	total = size + n - 1
+	total = ((total + n - 1) // n) * n
+	y = numpy.full(total, pad, dtype = 'float64')
+	y[n - 1:n - 1 + size] = x
+	blocks = y.reshape(-1, n)
+	prefix = ufunc.accumulate(blocks, axis = 1).ravel()
+	suffix = ufunc.accumulate(blocks[:, ::-1], axis = 1)[:, ::-1].ravel()
+	tail = prefix[n - 1:n - 1 + size]
+	out = ufunc(suffix[:size], tail)
+	if ufunc is numpy.add:
+		aligned = (numpy.arange(size) % n) == 0
+		out[aligned] = tail[aligned]
+	return out
+
+def _rolling_max (x, n):
+	return _rolling_reduce(x, n, numpy.maximum, -numpy.inf)
+
+def _rolling_min (x, n):
+	return _rolling_reduce(x, n, numpy.minimum, numpy.inf)
+
+def _rolling_sum (x, n):
+	return _rolling_reduce(x, n, numpy.add, 0.0)
+
+# number of samples in the (growing) window at each position
+def _rolling_count (size, n):
+	return numpy.minimum(numpy.arange(1, size + 1), n).astype('float64')
+
+# rolling population variance in the block layout of _rolling_reduce:
+# samples are centered on the first sample of their block, the suffix
+# of one block and the prefix of the next are merged with the pairwise
+# update of Chan et al, no E[x^2] - E[x]^2 over the raw values
+def _rolling_var (x, n):
+	x = numpy.asarray(x, dtype = 'float64')
+	size = len(x)
+	if size == 0 or n <= 1:
+		return numpy.zeros(size)
+	total = size + n - 1
+	total = ((total + n - 1) // n) * n
+	y = numpy.zeros(total)
+	w = numpy.zeros(total)
+	y[n - 1:n - 1 + size] = x
+	w[n - 1:n - 1 + size] = 1.0
+	y = y.reshape(-1, n)
+	w = w.reshape(-1, n)
+	first = numpy.argmax(w, axis = 1)
+	ref = y[numpy.arange(len(y)), first]
+	d = (y - ref[:, None]) * w
+	def scan (a, reverse):
+		if reverse:
+			return a[:, ::-1].cumsum(axis = 1)[:, ::-1].ravel()
+		return a.cumsum(axis = 1).ravel()
+	def stats (reverse, index):
+		c = scan(w, reverse)[index]
+		s1 = scan(d, reverse)[index]
+		s2 = scan(d * d, reverse)[index]
+		safe = numpy.where(c > 0, c, 1.0)
+		r = numpy.repeat(ref, n)[index]
+		return (c, r, s1 / safe, s2 - s1 * s1 / safe)
+	head = numpy.arange(size)
+	ca, ra, ma, qa = stats(True, head)
+	cb, rb, mb, qb = stats(False, head + n - 1)
+	aligned = (head % n) == 0
+	ca[aligned] = 0.0
+	qa[aligned] = 0.0
+	c = ca + cb
+	delta = (rb - ra) + (mb - ma)
+	q = qa + qb + delta * delta * ca * cb / c
+	return numpy.maximum(q / c, 0.0)
+
+
+#----------------------------------------------------------------------
+# BatchIndicator: same calculation as Indicator on numpy arrays, 
+# multi-column results are returned as a tuple of arrays
+#----------------------------------------------------------------------
+class BatchIndicator (object):
+
+	def __init__ (self):
+		if numpy is None:
+			raise ImportError('No module named numpy')
+
+	def EMA (self, array, n, m = 2):
+		x = numpy.asarray(array, dtype = 'float64')
+		if len(x) == 0:
+			return x.copy()
+		return _recursive_filter(x, m / (n + 1.0), x[0])
+
+	def SMA (self, array, n):
+		x = numpy.asarray(array, dtype = 'float64')
+		return _rolling_sum(x, n) / _rolling_count(len(x), n)
+
+	def SMD (self, array, n):
+		x = numpy.asarray(array, dtype = 'float64')
+		if len(x) == 0:
+			return x.copy()
+		return numpy.sqrt(_rolling_var(x, n))
+
+	def MACD (self, array, sm = 12, lm = 26, dm = 9):
+		x = numpy.asarray(array, dtype = 'float64')
+		if len(x) == 0:
+			return (x.copy(), x.copy(), x.copy())
+		ema1 = _recursive_filter(x, 2.0 / (sm + 1.0), x[0])
+		ema2 = _recursive_filter(x, 2.0 / (lm + 1.0), x[0])
+		diff = ema1 - ema2
+		dea = _recursive_filter(diff, 2.0 / (dm + 1.0), 0.0)
+		return (diff, dea, 2 * (diff - dea))
+
+	def KDJ (self, highs, lows, prices, n = 9, km = 3, dm = 3):
+		close = numpy.asarray(prices, dtype = 'float64')
+		high = _rolling_max(highs, n)
+		low = _rolling_min(lows, n)
+		span = high - low
+		flat = (span == 0)
+		rsv = (close - low) * 100.0 / numpy.where(flat, 1.0, span)
+		rsv[flat] = 0.0
+		K = _recursive_filter(rsv, 1.0 / km, 50.0)
+		D = _recursive_filter(K, 1.0 / dm, 50.0)
+		return (K, D, 3 * K - 2 * D)
+
+	def RSI (self, array, n = 6):
+		x = numpy.asarray(array, dtype = 'float64')
+		if len(x) == 0:
+			return x.copy()
+		delta = numpy.diff(x, prepend = x[0])
+		u = _rolling_sum(numpy.maximum(delta, 0.0), n) / float(n)
+		d = _rolling_sum(numpy.maximum(-delta, 0.0), n) / float(n)
+		t = u + d
+		zero = (t == 0)
+		rsi = (100.0 * u) / numpy.where(zero, 1.0, t)
+		rsi[zero] = 0.0
+		return rsi
+
+	def BOLL (self, array, n = 10, k = 2):
+		ma = self.SMA(array, n)
+		md = self.SMD(array, n)
+		return (ma, ma + k * md, ma - k * md)
+
+	# parabolic SAR is path dependent, run the recursion in one loop
+	def SAR (self, highs, lows, af = 0.02, maxaf = 0.2):
+		sar = SAR(af, maxaf)
+		size = len(highs)
+		out = numpy.zeros(size, dtype = 'float64')
+		bull = numpy.zeros(size, dtype = 'int8')
+		for i, (high, low) in enumerate(zip(highs, lows)):
+			out[i], bull[i] = sar.update(high, low)
+		return (out, bull)
+
+	def ATR (self, highs, lows, prices, n = 14):
+		high = numpy.asarray(highs, dtype = 'float64')
+		low = numpy.asarray(lows, dtype = 'float64')
+		close = numpy.asarray(prices, dtype = 'float64')
+		if len(high) == 0:
+			return high.copy()
+		prev = numpy.concatenate(([0.0], close[:-1]))
+		tr = numpy.maximum(numpy.abs(high - low), numpy.abs(high - prev))
+		tr = numpy.maximum(tr, numpy.abs(low - prev))
+		tr[0] = abs(high[0] - low[0])
+		return _recursive_filter(tr, 1.0 / n, tr[0])
+
+	def DONCHIAN (self, highs, lows, n = 20):
+		upper = _rolling_max(highs, n)
+		lower = _rolling_min(lows, n)
+		return ((upper + lower) * 0.5, upper, lower)
+
+	def WR (self, highs, lows, prices, n = 14):
+		close = numpy.asarray(prices, dtype = 'float64')
+		high = _rolling_max(highs, n)
+		low = _rolling_min(lows, n)
+		span = high - low
+		flat = (span == 0)
+		wr = (high - close) * -100.0 / numpy.where(flat, 1.0, span)
+		wr[flat] = 0.0
+		return wr
+
+
+#----------------------------------------------------------------------
+# per-instrument ring buffer: row i holds the last n values pushed for 
+# instrument i, unused slots keep the fill value. index is an array of
+# instrument rows or slice(None) for all of them.
+#----------------------------------------------------------------------
+class _BankRing (object):
+	def __init__ (self, count, n, fill = 0.0):
+		self.n = n
+		self.d = numpy.full((count, n), fill, dtype = 'float64')
+		self.p = numpy.zeros(count, dtype = 'int64')
+		self.k = numpy.zeros(count, dtype = 'int64')
+		self.rows = numpy.arange(count)
+	def rows_of (self, index):
+		if isinstance(index, slice):
+			return self.rows[index]
+		return index
+	# returns the evicted values (fill value while the row isn't full)
+	def push (self, index, values):
+		rows = self.rows_of(index)
+		pos = self.p[index]
+		old = self.d[rows, pos]
+		self.d[rows, pos] = values
+		pos += 1
+		pos[pos >= self.n] = 0
+		self.p[index] = pos
+		k = self.k[index]
+		self.k[index] = numpy.where(k < self.n, k + 1, k)
+		return old
+	def valid (self, index):
+		return numpy.arange(self.n)[None, :] < self.k[index][:, None]
+
+
+#----------------------------------------------------------------------
+# rolling sum of many instruments, running sums are resynced from the
+# ring every 'resync' rounds, and are exactly zero for all-zero windows
+#----------------------------------------------------------------------
+class _BankSum (object):
+	def __init__ (self, count, n, resync = 16):
+		self.ring = _BankRing(count, n)
+		self.s = numpy.zeros(count, dtype = 'float64')
+		self.z = numpy.zeros(count, dtype = 'int64')
+		self.t = 0
+		self.resync = max(1, n * resync)
+	def push (self, index, x):
+		old = self.ring.push(index, x)
+		s = self.s[index] + (x - old)
+		z = self.z[index] + (x != 0) - (old != 0)
+		s[z == 0] = 0.0
+		self.s[index] = s
+		self.z[index] = z
+		self.t += 1
+		if self.t % self.resync == 0:
+			self.s[:] = self.ring.d.sum(axis = 1)
+		return self.s
+
+#----------------------------------------------------------------------
+# rolling max (sign = 1) or min (sign = -1) of many instruments, only
+# rows which just evicted their extreme value are rescanned
+#----------------------------------------------------------------------
+class _BankExtrema (object):
+	def __init__ (self, count, n, sign = 1):
+		self.sign = sign
+		self.ring = _BankRing(count, n, -numpy.inf)
+		self.y = numpy.full(count, -numpy.inf)
+	def push (self, index, x):
+		x = x * self.sign
+		old = self.ring.push(index, x)
+		cur = self.y[index]
+		stale = (old >= cur) & (x < cur)
+		cur = numpy.maximum(cur, x)
+		if stale.any():
+			rows = self.ring.rows_of(index)[stale]
+			cur[stale] = self.ring.d[rows].max(axis = 1)
+		self.y[index] = cur
+		return self.y * self.sign
+
+
+#----------------------------------------------------------------------
+# vectorized state of the streaming indicators above, one slot per 
+# instrument, attribute names follow the streaming classes
+#----------------------------------------------------------------------
+class _BankEMA (object):
+	inputs = 1
+	def __init__ (self, count, mean, factor = 2):
+		self.m = mean
+		self.f = factor
+		self.x = numpy.zeros(count, dtype = 'float64')
+		self.init = numpy.zeros(count, dtype = 'bool')
+	def update (self, index, x):
+		m, f = self.m, self.f
+		old = self.x[index]
+		new = ((old * (m + 1 - f)) + f * x) / (m + 1.0)
+		self.x[index] = numpy.where(self.init[index], new, x)
+		self.init[index] = True
+		return self.x
+
+class _BankSMA (object):
+	inputs = 1
+	def __init__ (self, count, size):
+		self.sum = _BankSum(count, size)
+		self.y = numpy.zeros(count, dtype = 'float64')
+	def update (self, index, x):
+		s = self.sum.push(index, x)
+		self.y[index] = s[index] / self.sum.ring.k[index]
+		return self.y
+
+# Welford's mean/deviation with removal, as SMD
+class _BankSMD (object):
+	inputs = 1
+	def __init__ (self, count, size, resync = 16):
+		self.n = size
+		self.ring = _BankRing(count, size)
+		self.m = numpy.zeros(count, dtype = 'float64')
+		self.s = numpy.zeros(count, dtype = 'float64')
+		self.y = numpy.zeros(count, dtype = 'float64')
+		self.t = 0
+		self.resync = max(1, size * resync)
+	def update (self, index, x):
+		full = (self.ring.k[index] >= self.n)
+		old = self.ring.push(index, x)
+		k = self.ring.k[index].astype('float64')
+		mean = self.m[index]
+		s = self.s[index]
+		old = numpy.where(full, old, mean)
+		m = numpy.where(full, mean + (x - old) / k, mean + (x - mean) / k)
+		s = s + numpy.where(full, (x - old) * ((x - m) + (old - mean)),
+				(x - mean) * (x - m))
+		self.t += 1
+		if self.t % self.resync == 0:
+			d = self.ring.d[index]
+			m = d.sum(axis = 1) / k
+			dev = numpy.where(self.ring.valid(index), d - m[:, None], 0)
+			s = (dev * dev).sum(axis = 1)
+		self.m[index] = m
+		self.s[index] = s
+		self.y[index] = numpy.sqrt(numpy.maximum(s, 0.0) / k)
+		return self.y
+
+class _BankMACD (object):
+	inputs = 1
+	def __init__ (self, count, short_mean = 12, long_mean = 26, diff_mean = 9):
+		self.short_mean = short_mean
+		self.long_mean = long_mean
+		self.diff_mean = diff_mean
+		self.EMA12 = numpy.zeros(count, dtype = 'float64')
+		self.EMA26 = numpy.zeros(count, dtype = 'float64')
+		self.DIFF = numpy.zeros(count, dtype = 'float64')
+		self.DEA = numpy.zeros(count, dtype = 'float64')
+		self.BAR = numpy.zeros(count, dtype = 'float64')
+		self.init = numpy.zeros(count, dtype = 'bool')
+	def update (self, index, x):
+		sm, lm, dm = self.short_mean, self.long_mean, self.diff_mean
+		init = self.init[index]
+		e12 = (self.EMA12[index] * (sm - 1) + 2 * x) / (sm + 1.0)
+		e26 = (self.EMA26[index] * (lm - 1) + 2 * x) / (lm + 1.0)
+		e12 = numpy.where(init, e12, x)
+		e26 = numpy.where(init, e26, x)
+		diff = e12 - e26
+		dea = (self.DEA[index] * (dm - 1) + 2 * diff) / (dm + 1.0)
+		dea = numpy.where(init, dea, 0.0)
+		self.EMA12[index] = e12
+		self.EMA26[index] = e26
+		self.DIFF[index] = diff
+		self.DEA[index] = dea
+		self.BAR[index] = 2 * (diff - dea)
+		self.init[index] = True
+		return self.DIFF
+
+class _BankKDJ (object):
+	inputs = 3
+	def __init__ (self, count, period = 9, km = 3, dm = 3):
+		self.km = km
+		self.dm = dm
+		self.highs = _BankExtrema(count, period, 1)
+		self.lows = _BankExtrema(count, period, -1)
+		self.K = numpy.full(count, 50.0)
+		self.D = numpy.full(count, 50.0)
+		self.J = self.K * 3.0 - self.D * 2.0
+		self.RSV = numpy.zeros(count, dtype = 'float64')
+	def update (self, index, high, low, close):
+		high = self.highs.push(index, high)[index]
+		low = self.lows.push(index, low)[index]
+		span = high - low
+		flat = (span == 0)
+		rsv = (close - low) * 100.0 / numpy.where(flat, 1.0, span)
+		rsv[flat] = 0.0
+		k = (self.K[index] * (self.km - 1.0) + rsv) / self.km
+		d = (self.D[index] * (self.dm - 1.0) + k) / self.dm
+		self.RSV[index] = rsv
+		self.K[index] = k
+		self.D[index] = d
+		self.J[index] = 3 * k - 2 * d
+		return self.K
+
+class _BankRSI (object):
+	inputs = 1
+	def __init__ (self, count, n = 6):
+		self.n = n
+		self.us = _BankSum(count, n)
+		self.ds = _BankSum(count, n)
+		self.last = numpy.zeros(count, dtype = 'float64')
+		self.init = numpy.zeros(count, dtype = 'bool')
+		self.rsi = numpy.zeros(count, dtype = 'float64')
+	def update (self, index, x):
+		delta = numpy.where(self.init[index], x - self.last[index], 0.0)
+		u = self.us.push(index, numpy.maximum(delta, 0.0))[index]
+		d = self.ds.push(index, numpy.maximum(-delta, 0.0))[index]
+		self.last[index] = x
+		self.init[index] = True
+		u = u / float(self.n)
+		d = d / float(self.n)
+		t = u + d
+		zero = (t == 0)
+		rsi = (100.0 * u) / numpy.where(zero, 1.0, t)
+		rsi[zero] = 0.0
+		self.rsi[index] = rsi
+		return self.rsi
+
+class _BankBOLL (object):
+	inputs = 1
+	def __init__ (self, count, n = 10, k = 2):
+		self.md = _BankSMD(count, n)
+		self.k = k
+		self.BOLL = self.md.m
+		self.MD = self.md.y
+		self.UPPER = numpy.zeros(count, dtype = 'float64')
+		self.LOWER = numpy.zeros(count, dtype = 'float64')
+	def update (self, index, x):
+		self.md.update(index, x)
+		self.BOLL = self.md.m
+		self.MD = self.md.y
+		self.UPPER[index] = self.BOLL[index] + self.k * self.MD[index]
+		self.LOWER[index] = self.BOLL[index] - self.k * self.MD[index]
+		return self.BOLL
+
+class _BankATR (object):
+	inputs = 3
+	def __init__ (self, count, n = 14):
+		self.n = n
+		self.prev = numpy.zeros(count, dtype = 'float64')
+		self.init = numpy.zeros(count, dtype = 'bool')
+		self.TR = numpy.zeros(count, dtype = 'float64')
+		self.ATR = numpy.zeros(count, dtype = 'float64')
+	def update (self, index, high, low, close):
+		prev = self.prev[index]
+		tr1 = numpy.abs(high - low)
+		tr = numpy.maximum(tr1, numpy.abs(high - prev))
+		tr = numpy.maximum(tr, numpy.abs(low - prev))
+		init = self.init[index]
+		tr = numpy.where(init, tr, tr1)
+		atr = (self.ATR[index] * (self.n - 1.0) + tr) / self.n
+		self.ATR[index] = numpy.where(init, atr, tr)
+		self.TR[index] = tr
+		self.prev[index] = close
+		self.init[index] = True
+		return self.ATR
+
+
+#----------------------------------------------------------------------
+# IndicatorBank: indicators of many instruments advanced together,
+# a NaN price means the instrument has no tick in this update
+#----------------------------------------------------------------------
+class IndicatorBank (object):
+
+	kinds = {
+		'EMA': _BankEMA, 'SMA': _BankSMA, 'SMD': _BankSMD,
+		'MACD': _BankMACD, 'KDJ': _BankKDJ, 'RSI': _BankRSI,
+		'BOLL': _BankBOLL, 'ATR': _BankATR,
+	}
+
+	def __init__ (self, symbols):
+		if numpy is None:
+			raise ImportError('No module named numpy')
+		if isinstance(symbols, (int, long)):
+			symbols = list(xrange(symbols))
+		self.symbols = list(symbols)
+		self.index = dict([ (s, i) for i, s in enumerate(self.symbols) ])
+		self.count = len(self.symbols)
+		self.names = []
+		self.banks = {}
+		self.values = {}
+
+	# eg. bank.add('macd', 'MACD', 12, 26, 9), args as streaming class
+	def add (self, name, kind, *args, **kwargs):
+		if name in self.banks:
+			raise KeyError('indicator %s already exists'%name)
+		bank = self.kinds[kind.upper()](self.count, *args, **kwargs)
+		self.names.append(name)
+		self.banks[name] = bank
+		self.values[name] = None
+		return bank
+
+	def __getitem__ (self, name):
+		return self.banks[name]
+
+	def __contains__ (self, name):
+		return name in self.banks
+
+	# prices (and optional highs/lows) are vectors ordered as symbols,
+	# returns dict of name -> the value array update() would return
+	def update (self, prices, highs = None, lows = None):
+		close = numpy.asarray(prices, dtype = 'float64')
+		high = close
+		low = close
+		if highs is not None:
+			high = numpy.asarray(highs, dtype = 'float64')
+		if lows is not None:
+			low = numpy.asarray(lows, dtype = 'float64')
+		mask = ~numpy.isnan(close)
+		if mask.all():
+			index = slice(None)
+		else:
+			index = numpy.flatnonzero(mask)
+		x = close[index]
+		for name in self.names:
+			bank = self.banks[name]
+			if bank.inputs == 1:
+				value = bank.update(index, x)
+			else:
+				value = bank.update(index, high[index], low[index], x)
+			self.values[name] = value
+		return self.values
+
+	# latest values for one symbol: name -> float
+	def snapshot (self, symbol):
+		i = self.index[symbol]
+		return dict([ (k, float(v[i])) for k, v in self.values.items()
+			if v is not None ])
+
 
 #----------------------------------------------------------------------
 # Benchmark
@@ -396,6 +1085,7 @@ class Benchmark (object):
 #----------------------------------------------------------------------
 indicator = Indicator()
 benchmark = Benchmark()
+batch = (numpy is not None) and BatchIndicator() or None
 
 
 #----------------------------------------------------------------------
@@ -14,6 +14,8 @@ import time
 import os
 import json
 import math
+import array
+import bisect
 import decimal
 
 
@@ -26,21 +28,231 @@ if sys.version_info[0] >= 3:
 	xrange = range
 
 
+#----------------------------------------------------------------------
+# one side of the book: price levels kept in sort key order (price for
+# asks, -price for bids) and located by bisect, the cumulative level
+# tuples (price, size, total, sum) and the cumulative size / notional
+# lists (cvol / csum) are rebuilt lazily from the first changed level
+# when somebody reads them. 
+# compact mode stores every column in a float64 array.array instead
+# of python lists and doesn't keep the tuples at all.
+#----------------------------------------------------------------------
+class _BookSide (object):
+
+	def __init__ (self, reverse = False, compact = False):
+		self.reverse = reverse
+		self.compact = compact
+		self.keys = self._column()
+		self.prices = self._column()
+		self.sizes = self._column()
+		self.cvol = self._column()
+		self.csum = self._column()
+		self.items = (not compact) and [] or None
+		self.dirty = 0
+
+	def _column (self):
+		if self.compact:
+			return array.array('d')
+		return []
+
+	def __len__ (self):
+		return len(self.prices)
+
+	def _key (self, price):
+		return self.reverse and -price or price
+
+	# append a level, caller keeps the order
+	def push (self, price, size):
+		if self.dirty == len(self.cvol) == len(self.prices):
+			total = price * size
+			last = self.dirty and self.csum[-1] or 0.0
+			volume = self.dirty and self.cvol[-1] or 0.0
+			if self.items is not None:
+				self.items.append((price, size, total, last + total))
+			self.cvol.append(volume + size)
+			self.csum.append(last + total)
+			self.dirty += 1
+		self.keys.append(self._key(price))
+		self.prices.append(price)
+		self.sizes.append(size)
+
+	# set size of a price level, size <= 0 removes the level
+	def update (self, price, size):
+		key = self._key(price)
+		keys = self.keys
+		pos = bisect.bisect_left(keys, key)
+		if pos < len(keys) and keys[pos] == key:
+			if size > 0:
+				self.sizes[pos] = size
+			else:
+				del keys[pos]
+				del self.prices[pos]
+				del self.sizes[pos]
+		elif size > 0:
+			keys.insert(pos, key)
+			self.prices.insert(pos, price)
+			self.sizes.insert(pos, size)
+		else:
+			return False
+		self.dirty = min(self.dirty, pos)
+		return True
+
+	# bring cumulative columns up to date below position 'limit'
+	def build (self, limit = None):
+		count = len(self.prices)
+		if limit is None or limit > count:
+			limit = count
+		items, cvol, csum = self.items, self.cvol, self.csum
+		if self.dirty >= limit:
+			if limit == count and len(cvol) > count:
+				del cvol[count:]
+				del csum[count:]
+				if items is not None:
+					del items[count:]
+			return self
+		start = min(self.dirty, len(cvol))
+		del cvol[start:]
+		del csum[start:]
+		last = start > 0 and csum[-1] or 0.0
+		volume = start > 0 and cvol[-1] or 0.0
+		prices, sizes = self.prices, self.sizes
+		if items is not None:
+			del items[start:]
+			for i in xrange(start, limit):
+				price, size = prices[i], sizes[i]
+				total = price * size
+				last += total
+				volume += size
+				items.append((price, size, total, last))
+				cvol.append(volume)
+				csum.append(last)
+		else:
+			for i in xrange(start, limit):
+				price, size = prices[i], sizes[i]
+				last += price * size
+				volume += size
+				cvol.append(volume)
+				csum.append(last)
+		self.dirty = limit
+		return self
+
+	def levels (self):
+		self.build()
+		if self.items is None:
+			return _LevelView(self)
+		return self.items
+
+	def item (self, index):
+		if index < 0 or index >= len(self.prices):
+			return None
+		self.build(index + 1)
+		if self.items is None:
+			price, size = self.prices[index], self.sizes[index]
+			return (price, size, price * size, self.csum[index])
+		return self.items[index]
+
+	def total (self):
+		self.build()
+		return self.csum and self.csum[-1] or 0.0
+
+	def load (self, items):
+		self.__init__(self.reverse, self.compact)
+		for item in items:
+			self.push(item[0], item[1])
+		return len(items)
+
+	# numpy arrays of the columns, zero-copy views in compact mode 
+	# (the side can't grow while views are alive)
+	def columns (self):
+		import numpy
+		self.build()
+		names = ('prices', 'sizes', 'cvol', 'csum')
+		if self.compact:
+			return dict([ (n, numpy.frombuffer(getattr(self, n), 
+				dtype = 'float64')) for n in names ])
+		return dict([ (n, numpy.array(getattr(self, n), dtype = 'float64'))
+			for n in names ])
+
+
+#----------------------------------------------------------------------
+# read only sequence of level tuples over a compact side
+#----------------------------------------------------------------------
+class _LevelView (object):
+
+	def __init__ (self, side):
+		self.side = side
+
+	def __len__ (self):
+		return len(self.side.prices)
+
+	def __getitem__ (self, index):
+		size = len(self.side.prices)
+		if isinstance(index, slice):
+			return [ self[i] for i in xrange(*index.indices(size)) ]
+		if index < 0:
+			index += size
+		if index < 0 or index >= size:
+			raise IndexError('level index out of range')
+		return self.side.item(index)
+
+	def __iter__ (self):
+		side = self.side
+		side.build()
+		for price, size, csum in zip(side.prices, side.sizes, side.csum):
+			yield (price, size, price * size, csum)
+
+	def __eq__ (self, other):
+		return list(self) == list(other)
+
+	def __repr__ (self):
+		return repr(list(self))
+
+
 #----------------------------------------------------------------------
 # OrderBook
 #----------------------------------------------------------------------
 class OrderBook (object):
 
-	def __init__ (self, source = None):
+	# compact: keep levels in float64 arrays (see _BookSide)
+	def __init__ (self, source = None, compact = False):
 		self.time = None
+		self.compact = compact
 		self.reset()
 		self._load_source(source)
 	
 	def reset (self):
-		self.bids = []
-		self.asks = []
-		self.bids_sum = 0.0
-		self.asks_sum = 0.0
+		self._asks = _BookSide(False, self.compact)
+		self._bids = _BookSide(True, self.compact)
+
+	# level tuples: (price, size, total, cumulative total)
+	@property
+	def asks (self):
+		return self._asks.levels()
+
+	@asks.setter
+	def asks (self, items):
+		self._asks.load(items)
+
+	@property
+	def bids (self):
+		return self._bids.levels()
+
+	@bids.setter
+	def bids (self, items):
+		self._bids.load(items)
+
+	@property
+	def asks_sum (self):
+		return self._asks.total()
+
+	@property
+	def bids_sum (self):
+		return self._bids.total()
+
+	def _side (self, side):
+		if side in ('buy', 'bid', 'bids', 'biding', 'buyer'):
+			return self._bids
+		return self._asks
 
 	def _load_source (self, source):
 		self.reset()
@@ -56,46 +268,54 @@ class OrderBook (object):
 
 	# price must be sorted from low to high
 	def asks_push (self, price, size):
-		total = price * size
-		self.asks_sum += total	
-		self.asks.append((price, size, total, self.asks_sum))
+		self._asks.push(price, size)
 
 	# price must be sorted from high to low
 	def bids_push (self, price, size):
-		total = price * size
-		self.bids_sum += total
-		self.bids.append((price, size, total, self.bids_sum))
+		self._bids.push(price, size)
 
 	# price must be sorted from low to high
 	def asks_push_list (self, asks):
 		for item in asks:
-			price = item[0]
-			size = item[1]
-			total = price * size
-			self.asks_sum += total
-			self.asks.append((price, size, total, self.asks_sum))
+			self._asks.push(item[0], item[1])
 		return len(asks)
 
 	# price must be sorted from high to low
 	def bids_push_list (self, bids):
 		for item in bids:
-			price = item[0]
-			size = item[1]
-			total = price * size
-			self.bids_sum += total
-			self.bids.append((price, size, total, self.bids_sum))
+			self._bids.push(item[0], item[1])
 		return len(bids)
 
 	# sort list
 	def sort (self):
-		asks = self.asks
-		bids = self.bids
+		asks = [ (n[0], n[1]) for n in self.asks ]
+		bids = [ (n[0], n[1]) for n in self.bids ]
 		self.reset()
 		asks.sort()
 		bids.sort(reverse = True)
 		self.asks_push_list(asks)
 		self.bids_push_list(bids)
 
+	# up to date side with: keys (price, or -price for bids, ascending),
+	# prices, sizes, cvol (cumulative size), csum (cumulative notional)
+	def depth (self, side):
+		return self._side(side).build()
+
+	# numpy arrays: prices, sizes, cvol, csum
+	def columns (self, side):
+		return self._side(side).columns()
+
+	# apply one level diff: size is the new size at price, 0 to remove
+	def apply_delta (self, side, price, size):
+		return self._side(side).update(price, size)
+
+	# apply a list of (price, size) diffs on one side
+	def apply_delta_list (self, side, items):
+		book = self._side(side)
+		for item in items:
+			book.update(item[0], item[1])
+		return len(items)
+
 	# load from dict
 	def load_dict (self, source):
 		self.reset()
@@ -148,19 +368,11 @@ class OrderBook (object):
 
 	# best bid
 	def best_bid (self, index = 0):
-		if not self.bids:
-			return None
-		if index >= len(self.bids):
-			return None
-		return self.bids[index]
+		return self._bids.item(index)
 
 	# best ask
 	def best_ask (self, index = 0):
-		if not self.asks:
-			return None
-		if index >= len(self.asks):
-			return None
-		return self.asks[index]
+		return self._asks.item(index)
 
 	# fmt can be orgtbl
 	def tabulify (self, fmt = None):
@@ -246,76 +458,44 @@ class BookView (object):
 	def __init__ (self):
 		self.minimal_amount = 0.001
 
+	# all the depth queries below binary search the cumulative size 
+	# (cvol) and cumulative notional (csum) lists of the book side
 	def price_at_volume (self, orderbook, side, volume):
-		if side in ('buy', 'bid', 'bids', 'biding', 'buyer'):
-			items = orderbook.bids
-		else:
-			items = orderbook.asks
-		for item in items:
-			price, amount = item[0], item[1]
-			if amount >= volume:
-				return price
-			volume -= amount
-		return -1
+		book = orderbook.depth(side)
+		pos = bisect.bisect_left(book.cvol, volume)
+		if pos >= len(book.prices):
+			return -1
+		return book.prices[pos]
 
 	def price_avg_volume (self, orderbook, side, volume):
-		if side in ('buy', 'bid', 'bids', 'biding', 'buyer'):
-			items = orderbook.bids
-		else:
-			items = orderbook.asks
-		amount = volume
-		total_price = 0.0
-		if amount <= 0.0:
+		if volume <= 0.0:
 			return 0
-		for item in items:
-			price, quantity = item[0], item[1]
-			if amount > quantity:
-				amount -= quantity
-				total_price += quantity * price
-			else:
-				total_price += amount * price
-				amount = 0.0
-				break
-		if amount > 0:
+		book = orderbook.depth(side)
+		pos = bisect.bisect_left(book.cvol, volume)
+		if pos >= len(book.prices):
 			return -1
+		if pos == 0:
+			return book.prices[0]
+		total_price = book.csum[pos - 1]
+		total_price += (volume - book.cvol[pos - 1]) * book.prices[pos]
 		return total_price / volume
 
 	def volume_at_price (self, orderbook, side, price_limit):
-		if side in ('buy', 'bid', 'bids', 'biding', 'buyer'):
-			volume = 0.0
-			for item in orderbook.bids:
-				price, amount = item[0], item[1]
-				volume += amount
-				if price <= price_limit:
-					return volume
+		book = orderbook.depth(side)
+		if book.reverse:
+			pos = bisect.bisect_left(book.keys, -price_limit)
 		else:
-			volume = 0.0
-			for item in orderbook.asks:
-				price, amount = item[0], item[1]
-				volume += amount
-				if price >= price_limit:
-					return volume
-		return -1
+			pos = bisect.bisect_left(book.keys, price_limit)
+		if pos >= len(book.prices):
+			return -1
+		return book.cvol[pos]
 
 	def volume_at_level (self, orderbook, side, level):
-		volume = 0.0
-		if side in ('buy', 'bid', 'bids', 'biding', 'buyer'):
-			if not orderbook.bids:
-				return 0
-			for item in orderbook.bids:
-				volume += item[1]
-				if level <= 0:
-					break
-				level -= 1
-		else:
-			if not orderbook.asks:
-				return 0
-			for item in orderbook.asks:
-				volume += item[1]
-				if level <= 0:
-					break
-				level -= 1
-		return volume
+		book = orderbook.depth(side)
+		if not book.prices:
+			return 0
+		level = max(0, min(level, len(book.prices) - 1))
+		return book.cvol[level]
 
 	def price_at_level (self, orderbook, side, level):
 		if side in ('buy', 'bid', 'bids', 'biding', 'buyer'):
@@ -334,23 +514,18 @@ class BookView (object):
 	def buy_budget_to_volume (self, orderbook, budget, minlimit = None):
 		if minlimit is None:
 			minlimit = self.minimal_amount
-		volume = 0.0
-		cost = 0.0
-		for item in orderbook.asks:
-			price = item[0]
-			amount = item[1]
-			total = item[2]
-			if budget < total:
-				size = budget / price
-				if size < minlimit:
-					size = 0
-				volume += size
-				cost += size * price
-				budget -= size * price
-				break
-			volume += amount
-			cost += total
-			budget -= total
+		book = orderbook.depth('asks')
+		# levels before pos can be taken completely
+		pos = bisect.bisect_right(book.csum, budget)
+		volume = pos > 0 and book.cvol[pos - 1] or 0.0
+		cost = pos > 0 and book.csum[pos - 1] or 0.0
+		if pos < len(book.prices):
+			price = book.prices[pos]
+			size = (budget - cost) / price
+			if size < minlimit:
+				size = 0
+			volume += size
+			cost += size * price
 		if volume <= 0.0:
 			return None
 		return (volume, cost)
@@ -359,23 +534,17 @@ class BookView (object):
 	def sell_volume_to_profit (self, orderbook, volume, minlimit = None):
 		if minlimit is None:
 			minlimit = self.minimal_amount
-		sumvol = 0.0
-		profit = 0.0
-		for item in orderbook.bids:
-			price = item[0]
-			amount = item[1]
-			total = item[2]
-			if volume < amount:
-				size = volume
-				if size < self.minimal_amount:
-					size = 0
-				volume -= size
-				sumvol += size
-				profit += price * size
-				break
-			volume -= amount
-			sumvol += amount
-			profit += total
+		book = orderbook.depth('bids')
+		# levels before pos can be sold completely
+		pos = bisect.bisect_right(book.cvol, volume)
+		sumvol = pos > 0 and book.cvol[pos - 1] or 0.0
+		profit = pos > 0 and book.csum[pos - 1] or 0.0
+		if pos < len(book.prices):
+			size = volume - sumvol
+			if size < self.minimal_amount:
+				size = 0
+			sumvol += size
+			profit += book.prices[pos] * size
 		if sumvol <= 0.0:
 			return None
 		return (sumvol, profit)
@@ -442,6 +611,89 @@ class BookView (object):
 
 
 
+#----------------------------------------------------------------------
+# PathEvaluator: executable output of currency cycles for a list of
+# trial input sizes. books maps 'BASE/QUOTE' to OrderBook, a cycle is
+# a list of currencies, eg. ['USDT', 'BTC', 'ETH', 'USDT'].
+#----------------------------------------------------------------------
+class PathEvaluator (object):
+
+	def __init__ (self, books, factor = 1.5, minlimit = None, view = None):
+		self.books = books
+		self.factor = factor
+		self.minlimit = minlimit
+		self.view = view or BookView()
+		self.markets = {}
+		for symbol in books:
+			base, quote = symbol.split('/')
+			# quote -> base: buy with the asks, base -> quote: sell
+			self.markets[(quote, base)] = (symbol, '>')
+			self.markets[(base, quote)] = (symbol, '<')
+
+	# [(symbol, side), ...] of a cycle, None if a market is missing
+	def hops (self, cycle):
+		path = []
+		for i in xrange(len(cycle) - 1):
+			hop = self.markets.get((cycle[i], cycle[i + 1]))
+			if hop is None:
+				return None
+			path.append(hop)
+		return path
+
+	# all the triangular cycles from start currency back to itself
+	def triangles (self, start):
+		near = {}
+		for src, dst in self.markets:
+			near.setdefault(src, []).append(dst)
+		cycles = []
+		for c1 in near.get(start, []):
+			for c2 in near.get(c1, []):
+				if c2 != start and (c2, start) in self.markets:
+					cycles.append([start, c1, c2, start])
+		return cycles
+
+	# evaluate every cycle on every size, hop results are shared by all
+	# cycles with the same prefix. returns one dict per cycle with the
+	# outputs (-1 when not executable) and the best size by profit
+	def evaluate (self, cycles, sizes):
+		cache = {}
+		view = self.view
+		results = []
+		for cycle in cycles:
+			result = {'cycle': cycle, 'sizes': list(sizes), 'outputs': None,
+					'size': None, 'output': None, 'profit': None, 'ratio': None}
+			results.append(result)
+			path = self.hops(cycle)
+			if path is None:
+				continue
+			outputs = []
+			for size in sizes:
+				x = size
+				key = ()
+				for symbol, side in path:
+					key = key + (symbol, side)
+					y = cache.get((key, size))
+					if y is None:
+						y = view.currency_exchange(x, side, self.books[symbol],
+								self.factor, self.minlimit)
+						cache[(key, size)] = y
+					if y <= 0:
+						x = -1
+						break
+					x = y
+				outputs.append(x)
+			result['outputs'] = outputs
+			for size, y in zip(sizes, outputs):
+				if y <= 0:
+					continue
+				if result['profit'] is None or y - size > result['profit']:
+					result['size'] = size
+					result['output'] = y
+					result['profit'] = y - size
+					result['ratio'] = y / float(size)
+		return results
+
+
 #----------------------------------------------------------------------
 # bookview
 #----------------------------------------------------------------------